@@ -1,3 +1,4 @@
+import asyncio
 import pandas as pd
 from src.core.recommender import RAGRecommender # Import your "brain"
 import os
@@ -8,6 +9,20 @@ print("Starting prediction script...")
 TEST_SET_PATH = "data/provided/test_set.csv"
 OUTPUT_DIR = "submission"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "predictions.csv")
+MAX_CONCURRENT_LLM_CALLS = 8
+
+
+async def gather_analyses(recommender, queries, embeddings):
+    """Runs the Gemini query analyses concurrently (bounded by a semaphore)."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+    async def analyze(query, embedding):
+        async with semaphore:
+            return await recommender._analyze_query_with_llm_async(query, embedding)
+
+    return await asyncio.gather(*[
+        analyze(query, emb) for query, emb in zip(queries, embeddings)
+    ])
 
 # --- Main Script ---
 def main():
@@ -31,36 +46,49 @@ def main():
         return
         
     print("Recommender loaded. Generating predictions...")
-    
-    # 4. Loop, predict, and format
-    
-    # This list will hold all our final rows
-    submission_rows = [] 
-    
-    for query in queries:
-        # Get the list of recommendation dicts
-        recommendations = recommender.get_recommendations(query)
-        
+
+    # 4. Batch predict: one embedding pass, concurrent Gemini analyses,
+    #    and a single batched ChromaDB query -- instead of N serial round-trips.
+
+    # 4a. Embed every query in one vectorized pass
+    embeddings = recommender.embed_model.encode(
+        queries, batch_size=64, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=True
+    )
+
+    # 4b. Run all the Gemini analyses concurrently
+    analyses = asyncio.run(gather_analyses(recommender, queries, embeddings))
+
+    # 4c. In-process vector search over the cached embedding matrix
+    all_top_idx = [recommender._broad_search(emb, n_results=30) for emb in embeddings]
+
+    # 5. Rank each query's broad results and format the CSV rows.
+    # Two parallel column lists instead of a list of per-row dicts: the
+    # DataFrame is then built column-major in one shot.
+    out_queries = []
+    out_urls = []
+
+    for query, top_idx, type_keys in zip(queries, all_top_idx, analyses):
+        recommendations = recommender._rank_and_format(top_idx, type_keys)
+
         if not recommendations:
             print(f"Warning: No recommendations found for query: '{query[:50]}...'")
             continue
-            
+
         # Format for the CSV as per the PDF spec [cite: 153-164]
         for rec in recommendations:
-            submission_rows.append({
-                "Query": query,
-                "Assessment_url": rec['url']
-            })
+            out_queries.append(query)
+            out_urls.append(rec['url'])
 
-    # 5. Create DataFrame and save to CSV
-    if not submission_rows:
+    # 6. Create DataFrame and save to CSV
+    if not out_urls:
         print("No predictions were generated. Exiting.")
         return
-        
-    submission_df = pd.DataFrame(submission_rows)
-    
+
+    submission_df = pd.DataFrame({"Query": out_queries, "Assessment_url": out_urls}, copy=False)
+
     try:
-        submission_df.to_csv(OUTPUT_FILE, index=False)
+        submission_df.to_csv(OUTPUT_FILE, index=False, lineterminator='\n')
         print(f"\n--- Success! ---")
         print(f"Predictions file saved to {OUTPUT_FILE}")
     except Exception as e:
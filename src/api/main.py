@@ -1,5 +1,6 @@
 # src/api/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
+from functools import lru_cache
 from src.core.models import QueryRequest, RecommendResponse, AssessmentResponse
 from src.core.recommender import RAGRecommender
 import uvicorn
@@ -10,41 +11,48 @@ app = FastAPI(
     description="An API to recommend SHL assessments based on job descriptions."
 )
 
-# Load the RAG "brain"
-# This happens once on startup
-try:
-    recommender = RAGRecommender()
+@lru_cache(maxsize=1)
+def get_recommender() -> RAGRecommender:
+    """Builds the RAG "brain" exactly once per process.
+
+    With Gunicorn, run with --preload so the model is loaded in the master
+    before forking and the MiniLM weights sit in copy-on-write shared pages:
+      gunicorn src.api.main:app -k uvicorn.workers.UvicornWorker -w $(nproc) --preload
+    """
+    return RAGRecommender()
+
+@app.on_event("startup")
+def warm_load():
+    """Loads the recommender at startup so the first request isn't slow."""
+    get_recommender()
     print("API is ready to serve recommendations.")
-except Exception as e:
-    print(f"FATAL: Could not load Recommender. {e}")
-    recommender = None
 
 @app.get("/health")
-def health_check():
+def health_check(recommender: RAGRecommender = Depends(get_recommender)):
     """Health check endpoint"""
-    if not recommender:
+    if not recommender.ready:
         raise HTTPException(status_code=500, detail="Recommender model is not loaded")
     return {"status": "healthy"}
 
 @app.post("/recommend", response_model=RecommendResponse)
-def recommend_assessments(request: QueryRequest):
+async def recommend_assessments(request: QueryRequest, recommender: RAGRecommender = Depends(get_recommender)):
     """
     Takes a query and returns 5-10 relevant assessments.
     [cite: 14, 111, 113, 114]
     """
-    if not recommender:
+    if not recommender.ready:
         raise HTTPException(status_code=500, detail="Recommender model is not loaded")
-    
+
     try:
-        # 1. Get recommendations from the "brain"
-        results = recommender.get_recommendations(request.query)
-        
+        # 1. Get recommendations from the "brain" (yields during the Gemini call)
+        results = await recommender.get_recommendations(request.query)
+
         # 2. Format the results to match the required Pydantic/JSON spec [cite: 126]
         formatted_results = [AssessmentResponse(**meta) for meta in results]
-        
+
         # 3. Return the final JSON object
         return RecommendResponse(recommended_assessments=formatted_results)
-        
+
     except Exception as e:
         print(f"Error during recommendation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -52,4 +60,4 @@ def recommend_assessments(request: QueryRequest):
 if __name__ == "__main__":
     # This allows you to run the API directly for testing
     print("Starting API server on http://127.0.0.1:8000")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="127.0.0.1", port=8000)
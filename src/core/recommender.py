@@ -1,10 +1,17 @@
 # src/core/recommender.py
+import asyncio
+import atexit
 import chromadb
+import concurrent.futures
+import copy
 import google.generativeai as genai
+import numpy as np
+import orjson
 import os
 import json
-from sentence_transformers import SentenceTransformer
-from typing import List
+import pickle
+from src.core.embedding import load_embedding_model
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # Load environment variables (GEMINI_API_KEY)
@@ -13,7 +20,13 @@ load_dotenv()
 # Configuration
 DB_PATH = "data/processed/vector_store"
 COLLECTION_NAME = "shl_assessments"
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMB_MATRIX_PATH = "data/processed/embeddings.npy"
+METADATA_PATH = "data/processed/metadatas.json"
+CRAWLED_JSON_PATH = "data/crawled/shl_assessments.json"
+LLM_CACHE_PATH = "data/processed/llm_analysis_cache.pkl"
+LLM_CACHE_THRESHOLD = 0.92   # cosine similarity needed for a cache hit
+RESULT_CACHE_THRESHOLD = 0.95  # stricter: a hit skips the whole pipeline
+EXACT_CACHE_MAX_ENTRIES = 1024
 
 TEST_TYPE_MAP = {
     'A': 'Ability & Aptitude',
@@ -26,138 +39,517 @@ TEST_TYPE_MAP = {
     'S': 'Simulations'
 }
 
+# One bit per test-type letter, in TEST_TYPE_MAP order (A=1, B=2, C=4, ...).
+# Lets the hot loop test "does row i have type X?" with a single uint8 AND
+# instead of a Python substring search.
+TYPE_BITS = {key: 1 << i for i, key in enumerate(TEST_TYPE_MAP)}
+TYPE_NAME_BITS = {name: TYPE_BITS[key] for key, name in TEST_TYPE_MAP.items()}
+
+# Optional Numba JIT for the post-retrieval rerank (bucket + interleave +
+# dedup). The NumPy path below stays as the fallback when numba is absent.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _rerank_kernel(top_idx, type_masks, url_hashes, wanted_bits, max_results):
+        """Buckets the top hits by first matching type bit, interleaves the
+        buckets round-robin, and dedups by URL hash (small open-addressing
+        set) -- all in one compiled loop over int/uint arrays.
+        """
+        num_buckets = wanted_bits.shape[0]
+        n = top_idx.shape[0]
+
+        buckets = np.full((num_buckets, n), -1, dtype=np.int64)
+        counts = np.zeros(num_buckets, dtype=np.int64)
+        for j in range(n):
+            i = top_idx[j]
+            row_mask = type_masks[i]
+            for b in range(num_buckets):
+                if row_mask & wanted_bits[b]:
+                    buckets[b, counts[b]] = i
+                    counts[b] += 1
+                    break
+
+        out = np.empty(max_results, dtype=np.int64)
+        out_n = 0
+        cap = 64  # > n, so the probe loop always terminates
+        seen = np.full(cap, -1, dtype=np.int64)
+
+        max_len = 0
+        for b in range(num_buckets):
+            if counts[b] > max_len:
+                max_len = counts[b]
+
+        for pos in range(max_len):
+            for b in range(num_buckets):
+                if pos < counts[b]:
+                    i = buckets[b, pos]
+                    h = url_hashes[i]
+                    slot = h % cap
+                    dup = False
+                    while seen[slot] != -1:
+                        if seen[slot] == h:
+                            dup = True
+                            break
+                        slot = (slot + 1) % cap
+                    if not dup:
+                        seen[slot] = h
+                        out[out_n] = i
+                        out_n += 1
+                        if out_n >= max_results:
+                            return out[:out_n]
+        return out[:out_n]
+else:
+    _rerank_kernel = None
+
+# Constrain the query-analysis response to a short JSON array of category
+# letters: no markdown fences to strip, and far fewer output tokens.
+ANALYSIS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {"type": "string", "enum": list(TEST_TYPE_MAP)}
+    },
+    "max_output_tokens": 32,
+    "temperature": 0,
+}
+
+# The analysis task is a trivial 8-way classification -- flash is plenty
+# and roughly 10x cheaper/faster than pro.
+ANALYSIS_MODEL = 'models/gemini-2.5-flash'
+
+# Static part of the analysis prompt. Kept separate from the per-request
+# query line so it can be cached server-side via Gemini context caching.
+STATIC_PREAMBLE = """
+You are an expert recruitment assistant. Analyze the job query given at
+the end and identify the distinct skill domains required.
+
+The available SHL Test Type categories are:
+- A: Ability & Aptitude
+- B: Biodata & Situational Judgement
+- C: Competencies
+- D: Development & 360
+- E: Assessment Exercises
+- K: Knowledge & Skills (for specific technical skills like 'Java', 'Python', 'SQL')
+- P: Personality & Behavior (for soft skills like 'collaboration', 'leadership', 'teamwork')
+- S: Simulations
+
+Respond with a JSON list of the category letters that are relevant.
+For example, for "a Java developer who is a good team player", you
+should respond: ["K", "P"]
+"""
+
 # Configure the Gemini LLM
+preamble_is_cached = False
 try:
     genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    # --- FIX 1 (v6): Use the full model path ---
-    llm = genai.GenerativeModel('models/gemini-2.5-pro') 
-    # --- END FIX 1 ---
-    print("Gemini LLM configured successfully.")
+    try:
+        # Cache the static preamble server-side so each request only pays
+        # input tokens for the short query delta
+        from google.generativeai import caching
+        _cached_preamble = caching.CachedContent.create(
+            model=ANALYSIS_MODEL, contents=[STATIC_PREAMBLE], ttl="3600s"
+        )
+        llm = genai.GenerativeModel.from_cached_content(_cached_preamble)
+        preamble_is_cached = True
+        print("Gemini LLM configured with a cached prompt preamble.")
+    except Exception as e:
+        # Context caching can be unavailable (e.g. preamble below the
+        # minimum cacheable size) -- fall back to sending the full prompt
+        print(f"Gemini context caching unavailable ({e}). Using the plain model.")
+        llm = genai.GenerativeModel(ANALYSIS_MODEL)
+        print("Gemini LLM configured successfully.")
 except Exception as e:
     print(f"Error configuring Gemini: {e}")
     llm = None
 
+class SemanticCache:
+    """A tiny semantic cache for LLM query-analysis results.
+
+    Stores one L2-normalized query embedding per cached entry (as rows of a
+    single NumPy matrix) plus a parallel list of results. Lookup is a single
+    matrix-vector product: if the nearest cached query has cosine similarity
+    >= threshold, we return its result and skip the Gemini call entirely.
+    """
+
+    def __init__(self, path: Optional[str] = LLM_CACHE_PATH,
+                 threshold: float = LLM_CACHE_THRESHOLD, capacity: int = 10_000):
+        self.path = path
+        self.threshold = threshold
+        self.capacity = capacity
+        # Preallocated (capacity, dim) ring buffer -- allocated lazily once
+        # the embedding dim is known, written via a wrapping pointer so
+        # inserts never vstack/realloc.
+        self.embeddings = None
+        self.results = []   # parallel ring of cached results
+        self.size = 0
+        self.write_pos = 0
+        if self.path:
+            self._load()
+            # Persist whatever we learned when the process shuts down
+            atexit.register(self.save)
+
+    def _ensure_buffer(self, dim: int):
+        if self.embeddings is None:
+            self.embeddings = np.zeros((self.capacity, dim), dtype=np.float32)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            rows = np.asarray(data['embeddings'], dtype=np.float32)[-self.capacity:]
+            self._ensure_buffer(rows.shape[1])
+            self.size = len(rows)
+            self.write_pos = self.size % self.capacity
+            self.embeddings[:self.size] = rows
+            self.results = list(data['results'])[-self.capacity:]
+            print(f"Loaded semantic cache with {self.size} entries.")
+        except FileNotFoundError:
+            pass  # First run, cache starts empty
+        except Exception as e:
+            print(f"Warning: could not load semantic cache: {e}")
+
+    def get(self, embedding: np.ndarray):
+        """Returns the cached result for the nearest query, or None on a miss."""
+        if self.size == 0:
+            return None
+        sims = self.embeddings[:self.size] @ embedding  # single gemv over all cached queries
+        best = int(sims.argmax())
+        if sims[best] >= self.threshold:
+            return self.results[best]
+        return None
+
+    def put(self, embedding: np.ndarray, result):
+        row = np.asarray(embedding, dtype=np.float32)
+        self._ensure_buffer(row.shape[-1])
+        self.embeddings[self.write_pos] = row
+        if self.write_pos < len(self.results):
+            self.results[self.write_pos] = result  # Overwrite the oldest entry
+        else:
+            self.results.append(result)
+        self.write_pos = (self.write_pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def save(self):
+        if self.size == 0 or not self.path:
+            return
+        try:
+            with open(self.path, 'wb') as f:
+                pickle.dump({
+                    'embeddings': self.embeddings[:self.size],
+                    'results': self.results
+                }, f)
+        except Exception as e:
+            print(f"Warning: could not save semantic cache: {e}")
+
+
 class RAGRecommender:
     def __init__(self):
         print("Loading RAG Recommender...")
+        self.client = None
+        self.collection = None
+        self.ready = False
         try:
-            self.client = chromadb.PersistentClient(path=DB_PATH)
-            self.collection = self.client.get_collection(name=COLLECTION_NAME)
-            self.embed_model = SentenceTransformer(EMBEDDING_MODEL)
-            print("ChromaDB client and embedding model loaded.")
+            self.embed_model = load_embedding_model()
+            self.llm_cache = SemanticCache()
+            # Two-tier cache for whole /recommend responses: exact match on
+            # the normalized query text, then semantic match on the embedding
+            self._exact_cache = {}
+            self.result_cache = SemanticCache(path=None, threshold=RESULT_CACHE_THRESHOLD)
+            # Pool for CPU-bound work (encoding) so the event loop can keep
+            # serving other requests while a query is being embedded
+            self._cpu_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+            self._load_catalog()
+            self.ready = True
+            print("Catalog and embedding model loaded.")
         except Exception as e:
             print(f"Error initializing RAGRecommender: {e}")
-            self.client = None
             self.embed_model = None
 
-    def _analyze_query_with_llm(self, query: str) -> List[str]:
-        """Uses Gemini to analyze the query and extract relevant test types."""
+    def _load_catalog(self):
+        """Loads the embedding matrix + metadata for in-process search.
+
+        Preferred source is the .npy/.json pair written by the embedder:
+        np.load(..., mmap_mode="r") makes startup a file-open syscall and
+        lets the OS page cache serve the (tiny, ~600 KB) matrix. If those
+        files don't exist yet we fall back to pulling everything out of
+        ChromaDB once. Either way, the per-request vector search is just a
+        NumPy matrix-vector product over L2-normalized rows.
+        """
+        if os.path.exists(EMB_MATRIX_PATH) and os.path.exists(METADATA_PATH):
+            # Embedder saves the matrix already L2-normalized
+            self._emb_mat = np.load(EMB_MATRIX_PATH, mmap_mode="r")
+            with open(METADATA_PATH, "rb") as f:
+                self._metas = orjson.loads(f.read())
+            print(f"Loaded embedding matrix via mmap from {EMB_MATRIX_PATH}")
+        else:
+            print("No .npy matrix found. Falling back to a one-time ChromaDB load.")
+            chroma_host = os.getenv("CHROMA_HOST")
+            if chroma_host:
+                # Out-of-process Chroma (start with:
+                #   chroma run --path data/processed/vector_store --port 8001
+                # ) so N gunicorn workers share one server and one page-cache
+                # copy of the DB instead of each opening the SQLite+HNSW state
+                chroma_port = int(os.getenv("CHROMA_PORT", "8001"))
+                self.client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
+            else:
+                self.client = chromadb.PersistentClient(path=DB_PATH)
+            self.collection = self.client.get_collection(name=COLLECTION_NAME)
+            raw = self.collection.get(include=["embeddings", "metadatas"])
+            emb_mat = np.asarray(raw["embeddings"], dtype=np.float32)
+            norms = np.linalg.norm(emb_mat, axis=1, keepdims=True)
+            self._emb_mat = emb_mat / np.clip(norms, 1e-12, None)
+            self._metas = raw["metadatas"]
+
+        # Structure-of-arrays views over the metadata: parallel arrays for
+        # the fields the hot path touches, so ranking never chases dicts.
+        self._urls = np.array([meta['url'] for meta in self._metas])
+        # Non-negative 64-bit URL hashes for the compiled dedup kernel
+        self._url_hashes = np.array(
+            [hash(url) & 0x7FFFFFFFFFFFFFFF for url in self._urls], dtype=np.int64
+        )
+        # Pre-split test_type so the per-request split(',') disappears
+        self._type_lists = [
+            [t.strip() for t in meta['test_type'].split(',')] for meta in self._metas
+        ]
+        # Descriptions live in a side-car dict (url -> description) loaded
+        # once from the crawler output; the per-row metadata stays small.
+        self._descriptions = {}
+        try:
+            with open(CRAWLED_JSON_PATH, "rb") as f:
+                for item in orjson.loads(f.read()):
+                    self._descriptions[item['url']] = item.get('description', '')
+        except Exception as e:
+            print(f"Warning: could not load descriptions from {CRAWLED_JSON_PATH}: {e}")
+
+        self._type_masks = np.zeros(len(self._metas), dtype=np.uint8)
+        for i, meta in enumerate(self._metas):
+            mask = 0
+            for type_name, bit in TYPE_NAME_BITS.items():
+                if type_name in meta['test_type']:
+                    mask |= bit
+            self._type_masks[i] = mask
+
+        # FAISS inner-product index over the normalized rows. Equivalent to
+        # the NumPy matmul at this catalog size, but its SIMD distance
+        # kernels keep winning if the corpus grows.
+        self._faiss_index = None
+        try:
+            import faiss
+            self._faiss_index = faiss.IndexFlatIP(self._emb_mat.shape[1])
+            self._faiss_index.add(np.ascontiguousarray(self._emb_mat, dtype=np.float32))
+        except ImportError:
+            print("faiss not installed. Using the NumPy search fallback.")
+
+        print(f"Cached {len(self._metas)} assessment embeddings in memory.")
+
+    def _broad_search(self, query_norm: np.ndarray, n_results: int = 30) -> np.ndarray:
+        """In-process cosine search: returns the indices of the top matches."""
+        if self._faiss_index is not None:
+            n = min(n_results, self._faiss_index.ntotal)
+            query = np.ascontiguousarray(query_norm.reshape(1, -1), dtype=np.float32)
+            _, top = self._faiss_index.search(query, n)
+            return top[0]
+
+        scores = self._emb_mat @ query_norm
+        n = min(n_results, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        return top[np.argsort(-scores[top])]
+
+    def _build_analysis_prompt(self, query: str) -> str:
+        """Builds the Gemini prompt for query analysis.
+
+        When the static preamble is cached server-side only the query line
+        is sent; otherwise the preamble is prepended so implicit prefix
+        caching can still reuse it.
+        """
+        query_line = f'Query: "{query}"'
+        if preamble_is_cached:
+            return query_line
+        return f"{STATIC_PREAMBLE}\n{query_line}"
+
+    def _parse_llm_response(self, response_text: str, query_embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Parses Gemini's JSON list of test-type keys (with fallback)."""
+        # The response schema constrains output to a bare JSON array,
+        # so no markdown-fence cleanup is needed
+        test_types = json.loads(response_text)
+
+        if isinstance(test_types, list):
+            print(f"LLM identified test types: {test_types}")
+            if query_embedding is not None:
+                self.llm_cache.put(query_embedding, test_types)
+            return test_types
+
+        return ['K', 'P'] # Fallback
+
+    def _analyze_query_with_llm(self, query: str, query_embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Uses Gemini to analyze the query and extract relevant test types.
+
+        If a (normalized) query embedding is provided, the semantic cache is
+        checked first so that repeat-semantic queries skip the Gemini call.
+        """
+        if query_embedding is not None:
+            cached = self.llm_cache.get(query_embedding)
+            if cached is not None:
+                print(f"Semantic cache hit. Test types: {cached}")
+                return cached
+
         if not llm:
             print("LLM not configured. Falling back to simple search.")
             return ['K', 'P', 'A'] # Search all key types
 
-        prompt = f"""
-        You are an expert recruitment assistant. Analyze the following job query
-        and identify the distinct skill domains required.
-        
-        The available SHL Test Type categories are:
-        - A: Ability & Aptitude
-        - B: Biodata & Situational Judgement
-        - C: Competencies
-        - D: Development & 360
-        - E: Assessment Exercises
-        - K: Knowledge & Skills (for specific technical skills like 'Java', 'Python', 'SQL')
-        - P: Personality & Behavior (for soft skills like 'collaboration', 'leadership', 'teamwork')
-        - S: Simulations
-
-        Query: "{query}"
-
-        Respond ONLY with a JSON list of the category letters that are
-        relevant. For example, for "a Java developer who is a good team player",
-        you should respond: ["K", "P"]
-        """
-        
         try:
-            response = llm.generate_content(prompt)
-            cleaned_response = response.text.strip().replace("`", "").replace("json", "")
-            test_types = json.loads(cleaned_response)
-            
-            if isinstance(test_types, list):
-                print(f"LLM identified test types: {test_types}")
-                return test_types
-            
-            return ['K', 'P'] # Fallback
+            response = llm.generate_content(
+                self._build_analysis_prompt(query),
+                generation_config=ANALYSIS_GENERATION_CONFIG
+            )
+            return self._parse_llm_response(response.text, query_embedding)
         except Exception as e:
             print(f"Error in LLM query analysis: {e}. Falling back to 'K' and 'P'.")
             return ['K', 'P']
 
-    def _interleave_lists(self, *lists):
-        """Interleaves multiple lists to create a balanced result.
-           E.g., [k1, k2], [p1, p2] -> [k1, p1, k2, p2]
-        """
-        interleaved = []
-        max_len = max(len(l) for l in lists)
-        for i in range(max_len):
-            for l in lists:
-                if i < len(l):
-                    interleaved.append(l[i])
-        return interleaved
-
-    def get_recommendations(self, query: str, max_results: int = 10) -> List[dict]:
-        if not self.client or not self.embed_model:
+    async def _analyze_query_with_llm_async(self, query: str, query_embedding: Optional[np.ndarray] = None) -> List[str]:
+        """Async variant of _analyze_query_with_llm, for batched callers."""
+        if query_embedding is not None:
+            cached = self.llm_cache.get(query_embedding)
+            if cached is not None:
+                print(f"Semantic cache hit. Test types: {cached}")
+                return cached
+
+        if not llm:
+            print("LLM not configured. Falling back to simple search.")
+            return ['K', 'P', 'A'] # Search all key types
+
+        try:
+            response = await llm.generate_content_async(
+                self._build_analysis_prompt(query),
+                generation_config=ANALYSIS_GENERATION_CONFIG
+            )
+            return self._parse_llm_response(response.text, query_embedding)
+        except Exception as e:
+            print(f"Error in LLM query analysis: {e}. Falling back to 'K' and 'P'.")
+            return ['K', 'P']
+
+    async def get_recommendations(self, query: str, max_results: int = 10) -> List[dict]:
+        if not self.ready:
             return [{"error": "Recommender not initialized"}]
-            
-        # 1. Analyze the query to get test types (e.g., ['K', 'P'])
-        required_type_keys = self._analyze_query_with_llm(query)
-        # Convert keys to full names (e.g., ['Knowledge & Skills', 'Personality & Behavior'])
-        required_type_names = [TEST_TYPE_MAP.get(key) for key in required_type_keys if TEST_TYPE_MAP.get(key)]
-        
-        # 2. Embed the query
-        query_embedding = self.embed_model.encode(query).tolist()
-        
+
+        # 0. Exact-match cache: identical (normalized) query text skips
+        #    everything, including the embedding pass
+        cache_key = " ".join(query.strip().lower().split())
+        cached = self._exact_cache.get(cache_key)
+        if cached is not None:
+            print("Exact cache hit.")
+            return copy.deepcopy(cached)
+
+        # 1. Embed the query ONCE -- the embedding is shared between the
+        #    semantic cache lookups and the vector search below. encode() is
+        #    CPU-bound, so push it off the event loop.
+        loop = asyncio.get_running_loop()
+        query_embedding = await loop.run_in_executor(self._cpu_pool, self.embed_model.encode, query)
+        query_norm = query_embedding / np.linalg.norm(query_embedding)
+
+        # 1b. Semantic result cache: a near-identical earlier query returns
+        #     its stored response without the LLM call or the search
+        cached = self.result_cache.get(query_norm)
+        if cached is not None:
+            print("Semantic result cache hit.")
+            return copy.deepcopy(cached)
+
+        # 2. Analyze the query to get test types (e.g., ['K', 'P']).
+        #    The Gemini RTT is seconds long; awaiting it lets the event
+        #    loop serve other requests in the meantime.
+        required_type_keys = await self._analyze_query_with_llm_async(query, query_norm)
+
         # 3. --- "FETCH-THEN-RANK" ---
         print("Performing broad search (n=30)...")
         # Do a single, broad search without filtering. Get 30 results.
-        try:
-            broad_results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=30 
-            )
-        except Exception as e:
-            print(f"Error querying ChromaDB: {e}")
+        top_idx = self._broad_search(query_norm, n_results=30)
+
+        if len(top_idx) == 0:
             return []
 
-        if not broad_results['metadatas']:
+        # 4. Filter, rank, and format in Python to ensure balance
+        results = self._rank_and_format(top_idx, required_type_keys, max_results)
+
+        # 5. Insert into both cache tiers (deep-copied, since callers may
+        #    mutate the dicts we hand back)
+        if len(self._exact_cache) >= EXACT_CACHE_MAX_ENTRIES:
+            self._exact_cache.pop(next(iter(self._exact_cache)))  # Evict oldest
+        self._exact_cache[cache_key] = copy.deepcopy(results)
+        self.result_cache.put(query_norm, copy.deepcopy(results))
+
+        return results
+
+    def _rank_and_format(self, top_idx: np.ndarray, required_type_keys: List[str], max_results: int = 10) -> List[dict]:
+        """Buckets the top search hits by test type, interleaves the buckets
+        for balance, then de-duplicates and formats the response.
+        Shared by the single-query path and the batch prediction script.
+
+        The per-row type test is one uint8 AND against the precomputed
+        bitmasks -- no substring search or dict lookups in the loop. When
+        numba is available the whole stage runs as one compiled kernel.
+        """
+        wanted_bits = [TYPE_BITS[key] for key in required_type_keys if key in TYPE_BITS]
+        if not wanted_bits:
             return []
 
-        # 4. Filter and Rank in Python to ensure balance
-        ranked_lists = {name: [] for name in required_type_names}
-        
-        # Loop through our 30 results and sort them into buckets
-        for meta in broad_results['metadatas'][0]:
-            for type_name in required_type_names:
-                # 'test_type' is a string like "Knowledge & Skills, Something Else"
-                if type_name in meta['test_type']:
-                    ranked_lists[type_name].append(meta)
-                    break # Add to first matching bucket
-        
-        # 5. Interleave the lists to create a balanced result
-        final_list = self._interleave_lists(*ranked_lists.values())
-        
-        # 6. De-duplicate and format the final response
+        if _rerank_kernel is not None:
+            final_idx = _rerank_kernel(
+                np.asarray(top_idx, dtype=np.int64),
+                self._type_masks,
+                self._url_hashes,
+                np.array(wanted_bits, dtype=np.uint8),
+                max_results
+            )
+        else:
+            final_idx = self._rerank_numpy(top_idx, wanted_bits, max_results)
+
+        # Format the final response
         final_recommendations = []
-        seen_urls = set()
-        
-        for meta in final_list:
-            if meta['url'] not in seen_urls:
-                # Convert the "test_type" string back into a list for the API response
-                meta['test_type'] = [t.strip() for t in meta['test_type'].split(',')]
-                
-                final_recommendations.append(meta)
-                seen_urls.add(meta['url'])
-                
-            # Stop once we have 10 balanced results
-            if len(final_recommendations) >= max_results:
-                break
-                
-        return final_recommendations
\ No newline at end of file
+        for i in final_idx:
+            # Copy before formatting -- the metadatas are shared across requests
+            formatted = dict(self._metas[i])
+            # The "test_type" list form was pre-split at load time
+            formatted['test_type'] = list(self._type_lists[i])
+            # New-style metadata carries no description; pull it from the
+            # side-car (old stores that still embed it are left as-is)
+            if 'description' not in formatted:
+                formatted['description'] = self._descriptions.get(
+                    formatted['url'], "No description found."
+                )
+            final_recommendations.append(formatted)
+
+        return final_recommendations
+
+    def _rerank_numpy(self, top_idx: np.ndarray, wanted_bits: List[int], max_results: int) -> np.ndarray:
+        """NumPy fallback for the rerank stage (no numba)."""
+        # Sort the broad results into one bucket per required type
+        buckets = [[] for _ in wanted_bits]
+
+        for i in top_idx:
+            row_mask = self._type_masks[i]
+            for b, bit in enumerate(wanted_bits):
+                if row_mask & bit:
+                    buckets[b].append(int(i))
+                    break # Add to first matching bucket
+
+        # Interleave the buckets (e.g. [k1, k2], [p1, p2] -> [k1, p1, k2, p2])
+        # in one vectorized shot: pad each bucket to a common length with -1,
+        # stack, transpose-and-ravel, then drop the padding.
+        max_len = max(len(b) for b in buckets)
+        if max_len == 0:
+            return np.empty(0, dtype=np.int64)
+
+        padded = np.full((len(buckets), max_len), -1, dtype=np.int64)
+        for b, bucket in enumerate(buckets):
+            padded[b, :len(bucket)] = bucket
+        flat = padded.T.ravel()
+        flat = flat[flat >= 0]
+
+        # De-duplicate by URL while preserving the interleaved order
+        _, keep = np.unique(self._urls[flat], return_index=True)
+        return flat[np.sort(keep)][:max_results]
\ No newline at end of file
@@ -1,63 +1,125 @@
+import asyncio
+import httpx
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter, Retry
+import lxml.html
+from lxml import etree
+from selectolax.parser import HTMLParser
+from aiolimiter import AsyncLimiter
 import json
 import os
+import re
 import time
 
 # --- Configuration ---
 CATALOG_URL = "https://www.shl.com/solutions/products/product-catalog/"
 OUTPUT_DIR = "data/crawled"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "shl_assessments.json")
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+MAX_CONCURRENT_FETCHES = 16
+REQUESTS_PER_SECOND = 5  # Global politeness budget, shared by all workers
+
+# Precompiled XPath expressions for the catalog pages (compiled once at
+# import; lxml evaluates them in C instead of walking the tree in Python)
+WRAPPERS_XPATH = etree.XPath("//div[contains(@class, 'custom__table-wrapper')]")
+ROWS_XPATH = etree.XPath(".//tr[@data-entity-id]")
+LINK_XPATH = etree.XPath(".//a")
+KEYS_XPATH = etree.XPath(".//span[contains(@class, 'product-catalogue__key')]")
+TOOLTIP_KEYS_XPATH = etree.XPath(
+    "//div[@id='productCatalogueTooltip']"
+    "//li[contains(@class, 'custom__tooltip-item')]"
+    "/span[contains(@class, 'product-catalogue__key')]"
+)
+
+# Precompiled regexes for the detail pages: probe the embedded JSON-LD
+# blob and scalar field markers first, so most pages never need a full
+# HTML parse at all
+JSONLD_RE = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.I | re.S
+)
+DURATION_RE = re.compile(r"Duration[^0-9]{0,20}(\d+)", re.I)
+REMOTE_RE = re.compile(r"Remote\s*Testing[^YN]{0,40}(Yes|No)", re.I)
+ADAPTIVE_RE = re.compile(r"Adaptive[^YN]{0,60}(Yes|No)", re.I)
+
+# Shared session for the (sequential) catalog pagination: keeps the TCP +
+# TLS connection to shl.com alive across pages instead of handshaking per
+# request, and retries transient failures with backoff
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=20, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5)
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
 
 # --- Helper Functions ---
 
-def get_soup(url):
-    """Fetches a static URL and returns a BeautifulSoup object."""
+def get_tree(url):
+    """Fetches a static URL and returns a parsed lxml tree."""
     print(f"  Fetching: {url}")
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
-        return BeautifulSoup(response.text, 'html.parser')
+        return lxml.html.fromstring(response.text)
     except requests.RequestException as e:
         print(f"Error fetching {url}: {e}")
         return None
 
+async def fetch_html(url, client, semaphore, limiter):
+    """Fetches a URL (bounded + rate-limited) and returns the raw HTML."""
+    async with semaphore:
+        async with limiter:
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+                return response.text
+            except (httpx.HTTPError, Exception) as e:
+                print(f"Error fetching {url}: {e}")
+                return None
+
+async def fetch_all_pages(urls):
+    """Fetches all detail pages concurrently over a shared connection pool."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    limiter = AsyncLimiter(REQUESTS_PER_SECOND, 1)
+    async with httpx.AsyncClient(headers=HEADERS, timeout=10, follow_redirects=True) as client:
+        return await asyncio.gather(*[
+            fetch_html(url, client, semaphore, limiter) for url in urls
+        ])
+
 def make_absolute_url(url):
     """Ensures a URL is absolute."""
     if url.startswith('/'):
         return f"https://www.shl.com{url}"
     return url
 
-def get_test_type_map(soup):
+def get_test_type_map(tree):
     """Builds a dictionary to map 'K' to 'Knowledge & Skills'."""
     key_map = {}
     try:
-        tooltip = soup.find('div', id='productCatalogueTooltip')
-        list_items = tooltip.find_all('li', class_='custom__tooltip-item')
-        
-        for item in list_items:
-            key_tag = item.find('span', class_='product-catalogue__key')
+        for key_tag in TOOLTIP_KEYS_XPATH(tree):
             key = key_tag.text.strip()
-            value = key_tag.next_sibling.strip()
+            value = key_tag.tail.strip()  # The label follows the <span> key
             key_map[key] = value
-            
+
     except Exception as e:
         print(f"  Warning: Could not build test type map. Using keys only. Error: {e}")
-        
+
     print(f"  Built test type map: {key_map}")
     return key_map
 
-def scrape_assessment_details(assessment_url):
+def scrape_assessment_details(html, assessment_url):
     """
-    Scrapes the individual assessment page for detailed information.
-    This is the final TODO for you to complete.
+    Extracts detailed information from a fetched assessment page.
+
+    Cheap probes first: a JSON-LD blob (single json.loads) and precompiled
+    regexes for the scalar fields. The selectolax tree is only built when
+    both probes miss the description.
     """
-    # print(f"    > Scraping details from: {assessment_url}") # Optional
-    soup = get_soup(assessment_url)
-    if not soup:
+    if html is None:
         return None
 
     details = {
@@ -68,77 +130,85 @@ def scrape_assessment_details(assessment_url):
     }
 
     try:
-        # --- This selector is a strong guess, you can improve it ---
-        desc_div = soup.find('div', class_='product-catalogue__details-content')
-        if desc_div:
-            p_tags = desc_div.find_all('p')
-            full_desc = " ".join([p.text.strip() for p in p_tags if p.text.strip()])
-            if full_desc:
-                details['description'] = full_desc
-        
-        # --- TODO: Find selectors for duration, adaptive, etc. ---
-        # The PDF requires 'duration', 'adaptive_support', and 'remote_support'.
-        # You will need to "Inspect" the page to find these.
-        
-        # Example:
-        # info_list = soup.find('ul', class_='product-info-list')
-        # if info_list:
-        #     list_items = info_list.find_all('li')
-        #     for item in list_items:
-        #         if "Duration:" in item.text:
-        #             duration_str = item.text.split(":")[-1].strip().split(" ")[0]
-        #             try: details['duration'] = int(duration_str)
-        #             except ValueError: pass
-        
+        # 1. JSON-LD probe for the description
+        for match in JSONLD_RE.finditer(html):
+            try:
+                data = json.loads(match.group(1))
+            except (json.JSONDecodeError, ValueError):
+                continue
+            if isinstance(data, list):
+                data = data[0] if data else {}
+            description = data.get('description') if isinstance(data, dict) else None
+            if description:
+                details['description'] = description.strip()
+                break
+
+        # 2. Regex scan for the scalar fields
+        match = DURATION_RE.search(html)
+        if match:
+            details['duration'] = int(match.group(1))
+
+        match = REMOTE_RE.search(html)
+        if match:
+            details['remote_support'] = match.group(1).capitalize()
+
+        match = ADAPTIVE_RE.search(html)
+        if match:
+            details['adaptive_support'] = match.group(1).capitalize()
+
+        # 3. Full parse only when the cheap probes found no description
+        if details['description'] == "No description found.":
+            tree = HTMLParser(html)
+            # --- This selector is a strong guess, you can improve it ---
+            desc_div = tree.css_first('div.product-catalogue__details-content')
+            if desc_div:
+                p_texts = [p.text(strip=True) for p in desc_div.css('p')]
+                full_desc = " ".join([t for t in p_texts if t])
+                if full_desc:
+                    details['description'] = full_desc
+
         return details
 
     except Exception as e:
         print(f"    Error parsing details for {assessment_url}: {e}")
         return None
 
-def parse_page_for_items(soup, test_type_map):
+def parse_page_for_items(tree, test_type_map):
     """
     Parses a single catalog page (full or partial)
     and returns a list of items.
-    
-    This is the v17 "Simple Robust" logic
+
+    This is the v17 "Simple Robust" logic, on precompiled XPath
     """
     all_assessments = []
-    
+
     # --- v17 SMART PARSER ---
-    # Find all table wrappers on the page
-    all_table_wrappers = soup.find_all('div', class_='custom__table-wrapper')
-    
-    individual_tests_wrapper = None
-    
     # Find the *correct* wrapper: the one that has data-entity-id rows
-    for wrapper in all_table_wrappers:
-        if wrapper.find('tr', attrs={'data-entity-id': True}):
-            individual_tests_wrapper = wrapper
+    product_rows = []
+    for wrapper in WRAPPERS_XPATH(tree):
+        product_rows = ROWS_XPATH(wrapper)
+        if product_rows:
             break # Found it
-    
-    if not individual_tests_wrapper:
+
+    if not product_rows:
         print("  FAILURE: Could not find a table wrapper with 'data-entity-id' rows.")
-        return [] # Return empty list
+        return [] # This is how we find the end of the list
     # --- END v17 SMART PARSER ---
 
-    product_rows = individual_tests_wrapper.find_all('tr', attrs={'data-entity-id': True})
     print(f"  Found {len(product_rows)} product rows on this page.")
 
-    if not product_rows:
-        return [] # This is how we find the end of the list
-
     for row in product_rows:
         try:
-            link_tag = row.find('a')
-            if not link_tag: continue
+            link_tags = LINK_XPATH(row)
+            if not link_tags: continue
+            link_tag = link_tags[0]
 
-            assessment_name = link_tag.text.strip()
+            assessment_name = link_tag.text_content().strip()
             assessment_url = make_absolute_url(link_tag.get('href'))
 
-            key_tags = row.find_all('span', class_='product-catalogue__key')
+            key_tags = KEYS_XPATH(row)
             test_types = [test_type_map.get(tag.text.strip(), tag.text.strip()) for tag in key_tags]
-            
+
             assessment_data = {
                 "name": assessment_name,
                 "url": assessment_url,
@@ -148,7 +218,7 @@ def parse_page_for_items(soup, test_type_map):
         except Exception as e:
             print(f"  Error parsing a product row: {e}")
             continue
-            
+
     return all_assessments
 
 # --- Main Execution ---
@@ -158,14 +228,15 @@ def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
     print(f"Scraping catalog: {CATALOG_URL}")
-    main_soup = get_soup(CATALOG_URL)
-    
-    if not main_soup:
+    main_tree = get_tree(CATALOG_URL)
+
+    # lxml elements are falsy when childless, so test against None
+    if main_tree is None:
         print("Could not fetch the main catalog. Exiting.")
         return
-        
+
     # 1. Build the map of 'K' -> 'Knowledge & Skills'
-    test_type_map = get_test_type_map(main_soup)
+    test_type_map = get_test_type_map(main_tree)
     
     all_assessment_items = []
     page_count = 1
@@ -177,17 +248,17 @@ def main():
         if start_index == 0:
             page_url = CATALOG_URL
             print("\nScraping Page 1 (Main Page)...")
-            current_page_soup = main_soup
+            current_page_tree = main_tree
         else:
             page_url = f"{CATALOG_URL}?start={start_index}&type=1"
             print(f"\nScraping Page {page_count} ({page_url.split('?')[1]})...")
-            current_page_soup = get_soup(page_url)
-        
-        if not current_page_soup:
+            current_page_tree = get_tree(page_url)
+
+        if current_page_tree is None:
             print("  Failed to fetch page. Stopping.")
             break
-            
-        items_on_page = parse_page_for_items(current_page_soup, test_type_map)
+
+        items_on_page = parse_page_for_items(current_page_tree, test_type_map)
         
         # If a page comes back empty, we've reached the end
         if not items_on_page:
@@ -202,20 +273,23 @@ def main():
 
     print(f"\n--- Found {len(all_assessment_items)} total assessments across all {page_count-1} pages. ---")
 
-    # 4. Scrape details for each assessment
-    final_data = []
+    # 4. Scrape details for each assessment (concurrent fetch, then parse)
     start_time = time.time()
-    for i, item in enumerate(all_assessment_items):
+
+    detail_urls = [item['url'] for item in all_assessment_items]
+    print(f"Fetching {len(detail_urls)} detail pages ({MAX_CONCURRENT_FETCHES} workers, {REQUESTS_PER_SECOND} req/s)...")
+    pages = asyncio.run(fetch_all_pages(detail_urls))
+
+    final_data = []
+    for i, (item, html) in enumerate(zip(all_assessment_items, pages)):
         percent_done = (i+1) / len(all_assessment_items) * 100
         print(f"  Processing item {i+1}/{len(all_assessment_items)} ({percent_done:.1f}%) - {item['name']}", end='\r')
-        
-        details = scrape_assessment_details(item['url'])
-        
+
+        details = scrape_assessment_details(html, item['url'])
+
         if details:
             complete_data = {**item, **details}
             final_data.append(complete_data)
-        
-        time.sleep(0.2) 
 
     end_time = time.time()
     print(f"\nFinished processing all details in {end_time - start_time:.2f} seconds.")
@@ -1,16 +1,19 @@
 import json
+import numpy as np
+import orjson
 import pandas as pd
 import chromadb
 import os
 
-# 1. Import the embedding model
-from sentence_transformers import SentenceTransformer
+# 1. Import the embedding model loader (quantized ONNX when available)
+from src.core.embedding import load_embedding_model
 
 # --- Configuration ---
 JSON_FILE_PATH = "data/crawled/shl_assessments.json"
 DB_PATH = "data/processed/vector_store"
 COLLECTION_NAME = "shl_assessments"
-EMBEDDING_MODEL = "all-MiniLM-L6-v2" 
+EMB_MATRIX_PATH = "data/processed/embeddings.npy"
+METADATA_PATH = "data/processed/metadatas.json"
 
 def load_data(file_path):
     """Loads the crawled JSON data."""
@@ -42,10 +45,13 @@ def create_document_chunks(df):
         
         documents.append(doc_text)
         
+        # Note: 'description' is deliberately NOT stored here. The full text
+        # only feeds the embedding; at serve time the recommender looks
+        # descriptions up from the crawled JSON, keeping per-row metadata
+        # (and everything serialized per query) small.
         metadatas.append({
             "name": row['name'],
             "url": row['url'],
-            "description": row['description'],
             "test_type": test_type_str, # <-- Store the string, this fixes the error
             "duration": int(row['duration']) if pd.notna(row['duration']) else -1,
             "adaptive_support": row['adaptive_support'],
@@ -67,8 +73,7 @@ def main():
         return
 
     # 2. Initialize the embedding model
-    print(f"Loading embedding model: {EMBEDDING_MODEL}")
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    model = load_embedding_model()
     print("Model loaded.")
 
     # 3. Initialize the Vector Database (ChromaDB)
@@ -88,24 +93,42 @@ def main():
     # 4. Create the documents and metadata
     documents, metadatas, ids = create_document_chunks(df)
 
-    # 5. Embed and store the documents in ChromaDB
+    # 5. Embed all documents in one pass, then store them in ChromaDB
     print("Embedding documents... (This may take a moment)")
-    
-    batch_size = 100
+
+    # Sort by tokenized length so every batch pads to roughly its own
+    # length -- one long description no longer pads all the short ones.
+    lengths = model.tokenizer(documents, truncation=True, return_length=True)['length']
+    order = np.argsort(lengths)
+    sorted_docs = [documents[i] for i in order]
+
+    sorted_embeddings = model.encode(
+        sorted_docs, batch_size=64, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=True
+    )
+
+    # Undo the sort so embeddings line up with metadatas/ids again
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+
+    # 5b. Also persist the raw matrix + metadata for the serving path:
+    # np.load(..., mmap_mode="r") at startup is a file-open syscall vs
+    # seconds of ChromaDB unpickling.
+    np.save(EMB_MATRIX_PATH, embeddings.astype(np.float32))
+    with open(METADATA_PATH, "wb") as f:
+        f.write(orjson.dumps(metadatas))
+    print(f"Saved embedding matrix to {EMB_MATRIX_PATH} and metadata to {METADATA_PATH}")
+
+    # Batch of 250 is Chroma's sweet spot; the raw document text is only
+    # ever used for embedding, so don't store (and later re-pickle) it.
+    batch_size = 250
     for i in range(0, len(documents), batch_size):
-        print(f"  Embedding batch {i//batch_size + 1}/{ (len(documents)//batch_size) + 1}...")
-        
-        batch_docs = documents[i:i+batch_size]
-        batch_metadatas = metadatas[i:i+batch_size]
-        batch_ids = ids[i:i+batch_size]
-        
-        batch_embeddings = model.encode(batch_docs).tolist()
-        
+        print(f"  Adding batch {i//batch_size + 1}/{ (len(documents)//batch_size) + 1}...")
+
         collection.add(
-            embeddings=batch_embeddings,
-            documents=batch_docs,
-            metadatas=batch_metadatas,
-            ids=batch_ids
+            embeddings=embeddings[i:i+batch_size].tolist(),
+            metadatas=metadatas[i:i+batch_size],
+            ids=ids[i:i+batch_size]
         )
 
     print("\n--- Embedding Complete ---")
@@ -0,0 +1,36 @@
+# src/data_pipeline/export_onnx.py
+import os
+
+from src.core.embedding import EMBEDDING_MODEL, ONNX_MODEL_DIR, ONNX_MODEL_FILE
+
+# --- Configuration ---
+HF_MODEL_ID = f"sentence-transformers/{EMBEDDING_MODEL}"
+FP32_MODEL_FILE = os.path.join(ONNX_MODEL_DIR, "model.onnx")
+
+
+def main():
+    """One-time export: MiniLM -> ONNX -> dynamic int8 quantization.
+
+    Run this once (python -m src.data_pipeline.export_onnx); afterwards both
+    the recommender and the embedder pick up the quantized model
+    automatically via src.core.embedding.load_embedding_model().
+    """
+    print("Starting ONNX export of the embedding model...")
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+
+    # 1. Export the transformer to ONNX (also writes the tokenizer files)
+    from optimum.exporters.onnx import main_export
+    print(f"Exporting {HF_MODEL_ID} to {ONNX_MODEL_DIR}...")
+    main_export(HF_MODEL_ID, output=ONNX_MODEL_DIR, task="feature-extraction")
+
+    # 2. Dynamic int8 quantization of the weights
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    print("Quantizing to int8...")
+    quantize_dynamic(FP32_MODEL_FILE, ONNX_MODEL_FILE, weight_type=QuantType.QInt8)
+
+    print(f"\n--- Export Complete ---")
+    print(f"Quantized model saved to {ONNX_MODEL_FILE}")
+
+
+if __name__ == "__main__":
+    main()